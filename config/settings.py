@@ -3,9 +3,16 @@ MODEL_CONFIG = {
     "ollama_base_url": "http://localhost:11434",
     "model_name": "qwen2.5:1.5b",
     "fast_model": "qwen2.5:0.5b",
+    "tokenizer": "Qwen/Qwen2.5-1.5B-Instruct",
     "context_window": 2048,
+    "fast_context_window": 1024,
     "temperature": 0.7,
     "fast_temperature": 0.1,
+    "ttft_slo": 4.0,  # p90 time-to-first-token (s) above which chat degrades to the fast model
+    "latency_window": 60,
+    "max_queue_depth": 2,
+    "trivial_threshold": 0.1,
+    "trivial_max_words": 3,
 }
 
 NEURAL_CONFIG = {
@@ -19,11 +26,18 @@ MEMORY_CONFIG = {
     "use_chroma": True,
     "chroma_persist_dir": "chroma_db",
     "chroma_collection": "pkic_memory",
+    "default_tenant": "default",
+    "max_open_partitions": 64,
+    "max_stm_tenants": 256,
     "stm_buffer_size": 10,
     "embedding_model": "all-MiniLM-L6-v2",
     "memory_db_file": "memory_db.json",
     "profile_file": "profile.json",
-    "retrieval_threshold": 1.2
+    "retrieval_threshold": 1.2,
+    "lexical_prefilter_min_docs": 2000,
+    "lexical_rare_df": 0.05,
+    "proper_noun_boost": 1.5,
+    "rrf_k": 60
 }
 
 # === Hormone System ===
@@ -37,6 +51,33 @@ HORMONE_CONFIG = {
     "stability_threshold": 0.7,
 }
 
+# === Context Assembly ===
+CONTEXT_CONFIG = {
+    "response_reserve": 512,
+    "template_overhead": 16,
+    "history_share": 0.4,
+    "max_history_turns": 10,
+    "memory_candidates": 6,
+    "legacy_memories": 4,
+    "min_memory_tokens": 24,
+    "min_user_tokens": 64,
+    "token_cache_size": 2048,
+}
+
+# === Sentiment ===
+SENTIMENT_CONFIG = {
+    "temperature": 20.0,
+    "bias": 0.1,
+}
+
+# === Persistence ===
+PERSISTENCE_CONFIG = {
+    "snapshot_file": "agent_state.snap",
+    "wal_file": "agent_state.wal",
+    "snapshot_interval": 30,
+    "wal_fsync": False,
+}
+
 # === Agent Behavior ===
 BEHAVIOR_CONFIG = {
     "proactive_idle_min": 30,
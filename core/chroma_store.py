@@ -13,19 +13,30 @@ except Exception as e:
     Settings = None
     logging.warning(f"chromadb not installed: {e}")
 
+def build_where(sources: Optional[List[str]] = None, since: Optional[float] = None,
+                until: Optional[float] = None) -> Optional[dict]:
+    clauses = []
+    if sources: clauses.append({"source": {"$in": list(sources)}})
+    if since is not None: clauses.append({"timestamp": {"$gte": since}})
+    if until is not None: clauses.append({"timestamp": {"$lte": until}})
+    if not clauses: return None
+    return clauses[0] if len(clauses) == 1 else {"$and": clauses}
+
 class ChromaStore:
     def __init__(self, persist_directory: str = MEMORY_CONFIG["chroma_persist_dir"], 
-                 collection_name: str = MEMORY_CONFIG["chroma_collection"]):
+                 collection_name: str = MEMORY_CONFIG["chroma_collection"], client=None):
         if chromadb is None:
             raise RuntimeError("chromadb is not installed. Please install it to use vector memory.")
             
         os.makedirs(persist_directory, exist_ok=True)
         self.persist_dir = persist_directory
         
-        try:
-            self.client = chromadb.Client(Settings(persist_directory=persist_directory, is_persistent=True))
-        except TypeError:
-            self.client = chromadb.Client(Settings(persist_directory=persist_directory))
+        if client is not None: self.client = client
+        else:
+            try:
+                self.client = chromadb.Client(Settings(persist_directory=persist_directory, is_persistent=True))
+            except TypeError:
+                self.client = chromadb.Client(Settings(persist_directory=persist_directory))
         
         self.collection_name = collection_name
         
@@ -66,6 +77,16 @@ class ChromaStore:
         self.upsert([memory_id], [document], [embedding], [metadata])
         return memory_id
 
+    def add_memories(self, documents: List[str], embeddings: List[List[float]], sources: List[str]) -> List[str]:
+        ts = time.time()
+        ids, metadatas = [], []
+        for i, (document, source) in enumerate(zip(documents, sources)):
+            doc_hash = hashlib.sha256((document + str(ts) + str(i)).encode()).hexdigest()[:8]
+            ids.append(f"mem_{source}_{doc_hash}_{int(ts)}")
+            metadatas.append({"timestamp": ts, "source": source, "length": len(document)})
+        self.upsert(ids, documents, embeddings, metadatas)
+        return ids
+
     def query(self, query_embedding: List[float], top_k: int = 4, 
               threshold: Optional[float] = None, where: Optional[dict] = None):
         try:
@@ -97,6 +118,11 @@ class ChromaStore:
             logging.error(f"[Chroma] Query failed: {e}")
             return []
 
+    def get_all_documents(self) -> List[tuple]:
+        res = self.col.get(include=["documents", "metadatas"])
+        ids = res.get("ids") or []
+        return list(zip(ids, res.get("documents") or [], res.get("metadatas") or [{} for _ in ids]))
+
     def get_stats(self) -> Dict[str, Any]:
         try:
             return {
@@ -0,0 +1,139 @@
+import re
+import logging
+from functools import lru_cache
+from collections import OrderedDict
+from typing import List, Dict, Any, Tuple
+from config.settings import MODEL_CONFIG, CONTEXT_CONFIG
+
+ESTIMATE_PATTERN = re.compile(r"\w{1,4}|[^\w\s]")
+
+@lru_cache(maxsize=1)
+def load_tokenizer():
+    try:
+        from transformers import AutoTokenizer
+        tokenizer = AutoTokenizer.from_pretrained(MODEL_CONFIG["tokenizer"])
+        logging.info(f"[Context] Loaded tokenizer: {MODEL_CONFIG['tokenizer']}")
+        return tokenizer
+    except Exception as e:
+        logging.warning(f"[Context] Tokenizer unavailable, using estimate: {e}")
+        return None
+
+class TokenCounter:
+    def __init__(self, tokenizer=None, cache_size=CONTEXT_CONFIG["token_cache_size"]):
+        self.tokenizer = tokenizer
+        self.cache = OrderedDict()
+        self.cache_size = cache_size
+        self.stats = {"hits": 0, "misses": 0}
+
+    def _encode(self, text: str) -> List:
+        if self.tokenizer is not None: return self.tokenizer.encode(text, add_special_tokens=False)
+        return ESTIMATE_PATTERN.findall(text)
+
+    def count(self, text: str) -> int:
+        if text in self.cache:
+            self.cache.move_to_end(text)
+            self.stats["hits"] += 1
+            return self.cache[text]
+        self.stats["misses"] += 1
+        n = len(self._encode(text))
+        self.cache[text] = n
+        if len(self.cache) > self.cache_size: self.cache.popitem(last=False)
+        return n
+
+    def truncate(self, text: str, max_tokens: int) -> str:
+        keep = max(1, max_tokens - 1)
+        if self.tokenizer is not None:
+            ids = self.tokenizer.encode(text, add_special_tokens=False)
+            return text if len(ids) <= max_tokens else self.tokenizer.decode(ids[:keep]).rstrip() + "…"
+        matches = list(ESTIMATE_PATTERN.finditer(text))
+        if len(matches) <= max_tokens: return text
+        return text[:matches[keep - 1].end()].rstrip() + "…"
+
+class ContextBuilder:
+    def __init__(self, counter: TokenCounter = None):
+        self.counter = counter or TokenCounter(load_tokenizer())
+        self.stats = {"turns": 0, "prompt_tokens": 0, "legacy_tokens": 0, "unbounded_tokens": 0,
+                      "memories_trimmed": 0,
+                      "memories_dropped": 0, "history_dropped": 0, "prompt_trimmed": 0}
+        self.last = {}
+
+    def _fit(self, text: str, max_tokens: int) -> str:
+        for n in range(max_tokens, 0, -1):
+            fitted = self.counter.truncate(text, n)
+            if self.counter.count(fitted) <= max_tokens: return fitted
+        return ""
+
+    def _fit_fixed(self, system_prompt: str, identity: str, user_message: str, limit: int) -> Tuple[str, str, str]:
+        count = self.counter.count
+        if count(system_prompt) + count(identity) + count(user_message) <= limit: return system_prompt, identity, user_message
+        self.stats["prompt_trimmed"] += 1
+        user_message = self._fit(user_message, max(CONTEXT_CONFIG["min_user_tokens"], limit - count(system_prompt) - count(identity)))
+        identity = self._fit(identity, limit - count(system_prompt) - count(user_message))
+        system_prompt = self._fit(system_prompt, limit - count(identity) - count(user_message))
+        if count(system_prompt) + count(identity) + count(user_message) > limit:
+            user_message = self._fit(user_message, limit - count(system_prompt) - count(identity))
+        return system_prompt, identity, user_message
+
+    def build(self, system_prompt: str, user_message: str, history: List[str], memories: List[str],
+              num_ctx: int = MODEL_CONFIG["context_window"], identity: str = "") -> Tuple[str, str]:
+        count = self.counter.count
+        overhead = CONTEXT_CONFIG["template_overhead"]
+        raw_fixed = count(system_prompt) + count(identity) + count(user_message) + overhead
+        system_prompt, identity, user_message = self._fit_fixed(
+            system_prompt, identity, user_message, max(0, num_ctx - CONTEXT_CONFIG["response_reserve"] - overhead))
+        fixed = count(system_prompt) + count(identity) + count(user_message) + overhead
+        budget = max(0, num_ctx - CONTEXT_CONFIG["response_reserve"] - fixed)
+        history = history[-CONTEXT_CONFIG["max_history_turns"]:]
+        
+        mem_budget = int(budget * (1 - CONTEXT_CONFIG["history_share"])) if history else budget
+        kept_mems, used = [], 0
+        share = mem_budget // max(1, len(memories))
+        for mem in memories:
+            line = f"[Memory] {mem}"
+            n = count(line)
+            if used + n <= mem_budget:
+                kept_mems.append(line)
+                used += n
+            elif min(mem_budget - used, share) >= CONTEXT_CONFIG["min_memory_tokens"]:
+                trimmed = self.counter.truncate(line, min(mem_budget - used, share))
+                kept_mems.append(trimmed)
+                used += count(trimmed)
+                self.stats["memories_trimmed"] += 1
+            else: self.stats["memories_dropped"] += 1
+        
+        hist_budget, kept_hist, hist_used = budget - used, [], 0
+        for turn in reversed(history):
+            n = count(turn)
+            if hist_used + n > hist_budget: break
+            kept_hist.insert(0, turn)
+            hist_used += n
+        self.stats["history_dropped"] += len(history) - len(kept_hist)
+        
+        parts = [system_prompt] + ([identity] if identity else [])
+        if kept_hist: parts.append("RECENT CONVERSATION:\n" + "\n".join(kept_hist))
+        parts.append("CONTEXT:\n" + "\n".join(kept_mems))
+        prompt = "\n".join(parts)
+        
+        prompt_tokens = fixed + used + hist_used
+        legacy_mems = "\n".join(f"[Memory] {m}" for m in memories[:CONTEXT_CONFIG["legacy_memories"]])
+        legacy_tokens = raw_fixed + count(f"CONTEXT:\n{legacy_mems}")
+        unbounded_tokens = raw_fixed + sum(count(f"[Memory] {m}") for m in memories) + sum(count(t) for t in history)
+        self.stats["turns"] += 1
+        self.stats["prompt_tokens"] += prompt_tokens
+        self.stats["legacy_tokens"] += legacy_tokens
+        self.stats["unbounded_tokens"] += unbounded_tokens
+        self.last = {"num_ctx": num_ctx, "prompt_tokens": prompt_tokens, "legacy_tokens": legacy_tokens,
+                     "unbounded_tokens": unbounded_tokens,
+                     "memories": len(kept_mems), "history": len(kept_hist)}
+        return prompt, user_message
+
+    def get_stats(self) -> Dict[str, Any]:
+        turns = self.stats["turns"] or 1
+        return {
+            **self.stats,
+            "avg_prompt_tokens": round(self.stats["prompt_tokens"] / turns, 1),
+            "avg_legacy_tokens": round(self.stats["legacy_tokens"] / turns, 1),
+            "avg_unbounded_tokens": round(self.stats["unbounded_tokens"] / turns, 1),
+            "token_cache": self.counter.stats,
+            "last": self.last
+        }
@@ -1,5 +1,10 @@
 import logging
 import asyncio
+from config.settings import CONTEXT_CONFIG
+from core.context_builder import ContextBuilder
+
+def dream_topic(h_state):
+    return "a futuristic city" if h_state['stress'] < 0.5 else "handling a difficult error"
 
 class InferenceEngine:
     def __init__(self, network, memory_system, hormone_system, profile_manager):
@@ -7,33 +12,39 @@ class InferenceEngine:
         self.mem = memory_system
         self.hormones = hormone_system
         self.profile = profile_manager
+        self.context = ContextBuilder()
 
-    async def run_chat(self, user_message, state_check_func):
-        self.mem.add_to_buffer("User", user_message)
+    async def run_chat(self, user_message, state_check_func, tenant=None):
+        history = self.mem.get_recent_turns(CONTEXT_CONFIG["max_history_turns"], tenant=tenant)
+        self.mem.add_to_buffer("User", user_message, tenant=tenant)
         asyncio.create_task(self._analyze_input(user_message))
         
-        relevant_mems = self.mem.retrieve_relevant(user_message)
-        context_str = "\n".join([f"[Memory] {m}" for m in relevant_mems])
+        relevant_mems = self.mem.retrieve_relevant(user_message, top_k=CONTEXT_CONFIG["memory_candidates"], tenant=tenant)
         
         sys_prompt = self.net._build_system_prompt(self.hormones.get_state())
         core_identity = self.profile.get_core_prompt()
-        full_system_prompt = f"{sys_prompt}\n{core_identity}\nCONTEXT:\n{context_str}"
+        route = self.net.route(user_message)
+        full_system_prompt, prompt_message = self.context.build(sys_prompt, user_message, history, relevant_mems,
+                                                                num_ctx=route.num_ctx, identity=core_identity)
         
-        stream = await self.net.forward(user_message, full_system_prompt, stream=True)
+        stream = await self.net.forward(prompt_message, full_system_prompt, stream=True, route=route)
         if stream is None:
             yield "Sorry, I encountered an error."
             return
         
-        full_response = ""
+        full_response, interrupted = "", False
         async for chunk in stream:
             if state_check_func and state_check_func():
-                yield "[Interrupted]"
+                await stream.aclose()
+                interrupted = True
                 break
             content = chunk['message']['content']
             full_response += content
             yield content
+        interrupted = interrupted or stream.preempted
             
-        self.mem.add_to_buffer("Agent", full_response)
+        self.mem.add_to_buffer("Agent", f"{full_response} [interrupted]" if interrupted else full_response, tenant=tenant)
+        if interrupted: yield "[Interrupted]"
 
     async def _analyze_input(self, text):
         data = await self.net.extract_facts(text)
@@ -41,18 +52,19 @@ class InferenceEngine:
         if data.get("preference"): self.profile.add_fact(data["preference"])
 
     async def dream_loop(self, interrupt_check):
-        h_state = self.hormones.get_state()
-        topic = "a futuristic city" if h_state['stress'] < 0.5 else "handling a difficult error"
+        topic = dream_topic(self.hormones.get_state())
         logging.info(f"[Dream] Dreaming about {topic}...")
         
-        stream = await self.net.forward(f"Describe a scene about {topic}.", "You are dreaming. Be creative.", use_fast=True, stream=True)
+        stream = await self.net.forward(f"Describe a scene about {topic}.", "You are dreaming. Be creative.", use_fast=True, stream=True, background=True)
         full_dream = ""
         async for chunk in stream:
-            if interrupt_check(): return
+            if interrupt_check():
+                await stream.aclose()
+                return
             full_dream += chunk['message']['content']
+        if stream.preempted or not full_dream: return
         
         try:
             dream_text = f"Dream ({topic}): {full_dream}"
-            self.mem.queue.append(dream_text)
-            await self.mem.process_queue(self.net)
+            if not await self.mem.consolidate(dream_text, self.net, source="dream"): self.mem.enqueue(dream_text)
         except Exception as e: logging.error(f"[Dream] Failed to consolidate: {e}")
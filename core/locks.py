@@ -0,0 +1,30 @@
+import os
+import logging
+from typing import Optional
+
+try:
+    import fcntl
+except ImportError:
+    fcntl = None
+    logging.warning("fcntl unavailable: agent state locks are not enforced on this platform")
+
+def acquire_lock(lock_file: str) -> Optional[int]:
+    fd = os.open(lock_file, os.O_CREAT | os.O_RDWR, 0o644)
+    if fcntl is not None:
+        try: fcntl.flock(fd, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except OSError:
+            os.close(fd)
+            return None
+    os.ftruncate(fd, 0)
+    os.write(fd, str(os.getpid()).encode())
+    return fd
+
+def release_lock(fd: Optional[int]):
+    if fd is None: return
+    if fcntl is not None: fcntl.flock(fd, fcntl.LOCK_UN)
+    os.close(fd)
+
+def lock_owner(lock_file: str) -> Optional[int]:
+    try:
+        with open(lock_file, "r", encoding="utf-8") as f: return int(f.read().strip())
+    except (OSError, ValueError): return None
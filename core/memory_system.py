@@ -1,45 +1,147 @@
 import numpy as np
 import json
 import os
+import re
+import math
+import time
+import hashlib
 import logging
-from typing import List, Optional, Dict, Any
+from collections import OrderedDict, defaultdict
+from typing import List, Optional, Dict, Any, Tuple
 from sentence_transformers import SentenceTransformer
 from config.settings import MEMORY_CONFIG
+from core.locks import acquire_lock, release_lock, lock_owner
 
 try:
-    from core.chroma_store import ChromaStore
+    from core.chroma_store import ChromaStore, build_where
     HAS_CHROMA = True
 except Exception:
     HAS_CHROMA = False
 
 embedding_model = SentenceTransformer(MEMORY_CONFIG["embedding_model"])
 
+STOPWORDS = {"a", "an", "the", "is", "are", "was", "were", "be", "to", "of", "and", "or", "in", "on", "at", "for",
+             "with", "about", "what", "who", "when", "where", "which", "how", "do", "does", "did", "i", "you", "me",
+             "my", "your", "it", "this", "that", "can", "tell", "user", "agent"}
+
+def tokenize(text: str) -> List[str]:
+    return [t for t in re.findall(r"\w+", text.lower()) if len(t) > 1 and t not in STOPWORDS]
+
+def matches_filter(meta: Optional[dict], sources: Optional[List[str]] = None,
+                   since: Optional[float] = None, until: Optional[float] = None) -> bool:
+    meta = meta or {}
+    if sources and meta.get("source") not in sources: return False
+    ts = meta.get("timestamp")
+    if since is not None and (ts is None or ts < since): return False
+    if until is not None and (ts is None or ts > until): return False
+    return True
+
+PARTITION_KEY = re.compile(r"[a-zA-Z0-9](?:[a-zA-Z0-9_-]{0,38}[a-zA-Z0-9])?")
+
+def partition_key(tenant: str) -> str:
+    raw = str(tenant)
+    if PARTITION_KEY.fullmatch(raw): return raw
+    slug = re.sub(r"[^a-zA-Z0-9_-]", "_", raw)[:30].strip("_-")
+    digest = hashlib.sha1(raw.encode("utf-8")).hexdigest()[:8]
+    return f"{slug}-{digest}" if slug else digest
+
+class InvertedIndex:
+    def __init__(self, k1: float = 1.5, b: float = 0.75):
+        self.k1, self.b = k1, b
+        self.postings = defaultdict(dict)
+        self.doc_len = {}
+        self.docs = {}
+        self.meta = {}
+        self.total_len = 0
+
+    def __len__(self):
+        return len(self.docs)
+
+    def add(self, doc_id, text: str, meta: Optional[dict] = None):
+        if doc_id in self.docs: self.remove(doc_id)
+        terms = tokenize(text)
+        self.docs[doc_id] = text
+        self.meta[doc_id] = meta or {}
+        self.doc_len[doc_id] = len(terms)
+        self.total_len += len(terms)
+        for term in terms:
+            self.postings[term][doc_id] = self.postings[term].get(doc_id, 0) + 1
+
+    def remove(self, doc_id):
+        text = self.docs.pop(doc_id, None)
+        if text is None: return
+        self.meta.pop(doc_id, None)
+        self.total_len -= self.doc_len.pop(doc_id, 0)
+        for term in set(tokenize(text)):
+            self.postings[term].pop(doc_id, None)
+            if not self.postings[term]: del self.postings[term]
+
+    def doc_freq(self, term: str) -> int:
+        return len(self.postings.get(term, {}))
+
+    def search(self, query: str, top_k: int = 4) -> List[Tuple[Any, float, float]]:
+        terms = list(dict.fromkeys(tokenize(query)))
+        if not terms or not self.docs: return []
+        proper = {t.lower() for i, t in enumerate(re.findall(r"\w+", query)) if i > 0 and t[:1].isupper()}
+        n, avgdl = len(self.docs), self.total_len / len(self.docs) or 1.0
+        scores, hits = defaultdict(float), defaultdict(int)
+        for term in terms:
+            posting = self.postings.get(term)
+            if not posting: continue
+            idf = math.log(1 + (n - len(posting) + 0.5) / (len(posting) + 0.5))
+            if term in proper: idf *= MEMORY_CONFIG["proper_noun_boost"]
+            for doc_id, tf in posting.items():
+                norm = tf + self.k1 * (1 - self.b + self.b * self.doc_len[doc_id] / avgdl)
+                scores[doc_id] += idf * tf * (self.k1 + 1) / norm
+                hits[doc_id] += 1
+        ranked = sorted(scores.items(), key=lambda kv: kv[1], reverse=True)[:top_k]
+        return [(doc_id, score, hits[doc_id] / len(terms)) for doc_id, score in ranked]
+
 class NumpyVectorDB:
     def __init__(self, filepath=MEMORY_CONFIG["memory_db_file"]):
         self.filepath = filepath
         self.texts = []
+        self.metas = []
         self.vectors = None
         self.load()
 
-    def add(self, text, vector):
+    def add(self, text, vector, metadata=None):
         self.texts.append(text)
+        self.metas.append(metadata or {})
         vec_np = np.array([vector], dtype=np.float32)
         if self.vectors is None: self.vectors = vec_np
         else: self.vectors = np.vstack([self.vectors, vec_np])
         if len(self.texts) % 5 == 0: self.save()
 
+    def add_many(self, texts, vectors, metadatas=None):
+        if not texts: return
+        self.texts.extend(texts)
+        self.metas.extend(metadatas or [{} for _ in texts])
+        vec_np = np.asarray(vectors, dtype=np.float32)
+        self.vectors = vec_np if self.vectors is None else np.vstack([self.vectors, vec_np])
+        self.save()
+
     def search(self, query_vec, top_k=2, threshold=0.5):
+        return [self.texts[i] for i, _ in self.search_scored(query_vec, top_k, threshold)]
+
+    def search_scored(self, query_vec, top_k=2, threshold=0.5, candidates=None):
         if self.vectors is None or len(self.texts) == 0: return []
-        norm_vectors = np.linalg.norm(self.vectors, axis=1)
+        rows = np.arange(len(self.texts)) if candidates is None else np.asarray(sorted(candidates), dtype=np.int64)
+        if len(rows) == 0: return []
+        vectors = self.vectors[rows]
+        norm_vectors = np.linalg.norm(vectors, axis=1)
         norm_query = np.linalg.norm(query_vec)
         if norm_query == 0: return []
-        similarities = np.dot(self.vectors, query_vec) / (norm_vectors * norm_query)
+        similarities = np.dot(vectors, query_vec) / (norm_vectors * norm_query)
         indices = np.where(similarities > threshold)[0]
         sorted_indices = indices[np.argsort(similarities[indices])[::-1]]
-        return [self.texts[i] for i in sorted_indices[:top_k]]
+        return [(int(rows[i]), float(similarities[i])) for i in sorted_indices[:top_k]]
+
+    def filter_rows(self, sources=None, since=None, until=None) -> List[int]:
+        return [i for i, meta in enumerate(self.metas) if matches_filter(meta, sources, since, until)]
 
     def save(self):
-        data = {"texts": self.texts, "vectors": self.vectors.tolist() if self.vectors is not None else []}
+        data = {"texts": self.texts, "metas": self.metas, "vectors": self.vectors.tolist() if self.vectors is not None else []}
         with open(self.filepath, "w", encoding="utf-8") as f: json.dump(data, f)
 
     def load(self):
@@ -48,69 +150,267 @@ class NumpyVectorDB:
                 with open(self.filepath, "r", encoding="utf-8") as f:
                     data = json.load(f)
                     self.texts = data.get("texts", [])
+                    self.metas = data.get("metas") or [{} for _ in self.texts]
                     if data.get("vectors"): self.vectors = np.array(data["vectors"], dtype=np.float32)
             except Exception as e: logging.error(f"Memory load failed: {e}")
 
 class ContextManager:
-    def __init__(self, use_chroma=MEMORY_CONFIG["use_chroma"], chroma_persist_dir=MEMORY_CONFIG["chroma_persist_dir"]):
-        self.buffer = []
-        self.queue = []
+    def __init__(self, use_chroma=MEMORY_CONFIG["use_chroma"], chroma_persist_dir=MEMORY_CONFIG["chroma_persist_dir"],
+                 tenant=MEMORY_CONFIG["default_tenant"], memory_db_file=MEMORY_CONFIG["memory_db_file"]):
+        self.tenant = partition_key(tenant)
+        self.buffers = {self.tenant: []}
+        self.queues = {self.tenant: []}
+        self.consolidating = {}
+        self.wal = None
         self.max_buffer = MEMORY_CONFIG["stm_buffer_size"]
+        self.chroma_persist_dir = chroma_persist_dir
+        self.memory_db_file = memory_db_file
+        self._store_lock = None
+        self.partitions = OrderedDict()
         self._using = "numpy"
         self._init_db(use_chroma, chroma_persist_dir)
-        self.stats = {"consolidated_count": 0, "retrieved_count": 0}
+        self.stats = {"consolidated_count": 0, "retrieved_count": 0, "lexical_shortcuts": 0, "prefiltered": 0}
+        self._embed_cache = OrderedDict()
+        self.lexicon = self._build_lexicon(self.db)
+        self.partitions[self.tenant] = (self.db, self.lexicon)
 
     def _init_db(self, use_chroma, chroma_persist_dir):
         if use_chroma and HAS_CHROMA:
             try:
-                self.db = ChromaStore(persist_directory=chroma_persist_dir)
+                self.db = ChromaStore(persist_directory=chroma_persist_dir, collection_name=self._collection_name(self.tenant))
                 self._using = "chroma"
                 logging.info("[Memory] Using Chroma Vector DB")
                 return
             except Exception as e: logging.warning(f"[Memory] Chroma failed: {e}")
-        self.db = NumpyVectorDB()
+        self.db = NumpyVectorDB(self._shard_file(self.tenant))
         logging.info("[Memory] Using Numpy Vector DB")
 
-    def add_to_buffer(self, role: str, content: str):
-        self.buffer.append(f"{role}: {content}")
-        if len(self.buffer) > self.max_buffer:
-            self.queue.append(self.buffer.pop(0))
+    def _collection_name(self, tenant: str) -> str:
+        base = MEMORY_CONFIG["chroma_collection"]
+        return base if tenant == MEMORY_CONFIG["default_tenant"] else f"{base}__{tenant}"
+
+    def _shard_file(self, tenant: str) -> str:
+        base, ext = os.path.splitext(self.memory_db_file)
+        return self.memory_db_file if tenant == MEMORY_CONFIG["default_tenant"] else f"{base}.{tenant}{ext}"
+
+    def lock_store(self):
+        if self._store_lock is not None: return
+        self._store_lock = acquire_lock(self.memory_db_file + ".lock")
+        if self._store_lock is None:
+            raise RuntimeError(f"Memory store {self.memory_db_file} is locked by process {lock_owner(self.memory_db_file + '.lock')}")
+
+    def unlock_store(self):
+        release_lock(self._store_lock)
+        self._store_lock = None
+
+    def _build_lexicon(self, db) -> InvertedIndex:
+        lexicon = InvertedIndex()
+        try:
+            if self._using == "chroma": entries = db.get_all_documents()
+            else: entries = zip(range(len(db.texts)), db.texts, db.metas)
+            for doc_id, text, meta in entries: lexicon.add(doc_id, text, meta)
+            logging.info(f"[Memory] Inverted index built over {len(lexicon)} memories")
+        except Exception as e: logging.warning(f"[Memory] Inverted index build failed: {e}")
+        return lexicon
+
+    def _partition_exists(self, key: str) -> bool:
+        if self._using != "chroma": return os.path.exists(self._shard_file(key))
+        try:
+            self.db.client.get_collection(name=self._collection_name(key))
+            return True
+        except Exception: return False
+
+    def _partition(self, tenant: Optional[str] = None, create: bool = True):
+        key = partition_key(tenant) if tenant else self.tenant
+        if key in self.partitions: self.partitions.move_to_end(key)
+        else:
+            if not create and not self._partition_exists(key): return None
+            if self._using == "chroma":
+                db = ChromaStore(persist_directory=self.chroma_persist_dir, collection_name=self._collection_name(key), client=self.db.client)
+            else: db = NumpyVectorDB(self._shard_file(key))
+            self.partitions[key] = (db, self._build_lexicon(db))
+            logging.info(f"[Memory] Opened partition '{key}' ({len(self.partitions)} total)")
+            self._evict_partitions()
+        return self.partitions[key]
+
+    def _evict_partitions(self):
+        while len(self.partitions) > MEMORY_CONFIG["max_open_partitions"]:
+            key = next(k for k in self.partitions if k != self.tenant)
+            db, _ = self.partitions.pop(key)
+            if self._using != "chroma" and db.texts: db.save()
+            logging.info(f"[Memory] Closed idle partition '{key}'")
+
+    def add_memory(self, text: str, vector: List[float], source: str = "consolidation", tenant: Optional[str] = None):
+        db, lexicon = self._partition(tenant)
+        meta = {"timestamp": time.time(), "source": source}
+        if self._using == "chroma": doc_id = db.add_memory(text, vector, source=source)
+        else:
+            db.add(text, vector, meta)
+            doc_id = len(db.texts) - 1
+        lexicon.add(doc_id, text, meta)
+        return doc_id
+
+    def _log(self, op: str, *args):
+        if self.wal: self.wal(op, *args)
+
+    def add_memories(self, items: List[Tuple[str, List[float], str]], tenant: Optional[str] = None) -> int:
+        if not items: return 0
+        db, lexicon = self._partition(tenant)
+        texts, vectors, sources = (list(col) for col in zip(*items))
+        ts = time.time()
+        metas = [{"timestamp": ts, "source": source} for source in sources]
+        if self._using == "chroma": doc_ids = db.add_memories(texts, vectors, sources)
+        else:
+            doc_ids = range(len(db.texts), len(db.texts) + len(texts))
+            db.add_many(texts, vectors, metas)
+        for doc_id, text, meta in zip(doc_ids, texts, metas): lexicon.add(doc_id, text, meta)
+        return len(items)
+
+    @property
+    def buffer(self) -> List[str]:
+        return self.buffers.setdefault(self.tenant, [])
+
+    @property
+    def queue(self) -> List[str]:
+        return self.queues.setdefault(self.tenant, [])
+
+    def _key(self, tenant: Optional[str] = None) -> str:
+        return partition_key(tenant) if tenant else self.tenant
+
+    def add_to_buffer(self, role: str, content: str, tenant: Optional[str] = None):
+        key = self._key(tenant)
+        self._log("buffer", role, content, key)
+        buffer = self.buffers[key] = self.buffers.pop(key, [])
+        buffer.append(f"{role}: {content}")
+        if len(buffer) > self.max_buffer:
+            self.queues.setdefault(key, []).append(buffer.pop(0))
+        self._evict_buffers()
 
-    def get_recent_context(self, num_turns: int = 5) -> str:
-        return "\n".join(self.buffer[-num_turns:])
+    def _evict_buffers(self):
+        while len(self.buffers) > MEMORY_CONFIG["max_stm_tenants"]:
+            key = next(k for k in self.buffers if k != self.tenant)
+            self._log("flush", key)
+            self.queues.setdefault(key, []).extend(self.buffers.pop(key))
 
-    async def process_queue(self, neural_engine):
-        if not self.queue: return
-        text = self.queue.pop(0)
+    def enqueue(self, text: str, tenant: Optional[str] = None):
+        key = self._key(tenant)
+        self._log("enqueue", text, key)
+        self.queues.setdefault(key, []).append(text)
+
+    def get_recent_turns(self, num_turns: int = 5, tenant: Optional[str] = None) -> List[str]:
+        return self.buffers.get(self._key(tenant), [])[-num_turns:] if num_turns > 0 else []
+
+    def get_recent_context(self, num_turns: int = 5, tenant: Optional[str] = None) -> str:
+        return "\n".join(self.get_recent_turns(num_turns, tenant))
+
+    async def process_queue(self, neural_engine, tenant: Optional[str] = None):
+        key = self._key(tenant)
+        queue = self.queues.get(key)
+        if not queue: return
+        text = queue.pop(0)
+        inflight = self.consolidating.setdefault(key, [])
+        inflight.append(text)
+        try:
+            if await self.consolidate(text, neural_engine, tenant=key): self._log("ack", text, key)
+            else: self.queues.setdefault(key, []).insert(0, text)
+        finally:
+            inflight.remove(text)
+            if not inflight: self.consolidating.pop(key, None)
+            if not self.queues.get(key) and key != self.tenant: self.queues.pop(key, None)
+
+    async def consolidate(self, text: str, neural_engine, source: str = "consolidation", tenant: Optional[str] = None) -> bool:
         try:
             summary = await neural_engine.compress_text(text)
+            if summary in (None, "..."): return False
             vector = embedding_model.encode(summary).tolist()
-            if self._using == "chroma": self.db.add_memory(summary, vector, source="consolidation")
-            else: self.db.add(summary, vector)
+            self.add_memory(summary, vector, source=source, tenant=tenant)
             self.stats["consolidated_count"] += 1
-            logging.info(f"[Memory/LTM] ✓ Consolidated: {summary[:60]}...")
-        except Exception as e: logging.error(f"[Memory/LTM] Process failed: {e}")
+            logging.info(f"[Memory/LTM] ✓ Consolidated ({source}): {summary[:60]}...")
+        except Exception as e:
+            logging.error(f"[Memory/LTM] Process failed: {e}")
+            return False
+        return True
+
+    def encode(self, text: str) -> List[float]:
+        if text in self._embed_cache:
+            self._embed_cache.move_to_end(text)
+            return self._embed_cache[text]
+        vector = embedding_model.encode(text).tolist()
+        self._embed_cache[text] = vector
+        if len(self._embed_cache) > 32: self._embed_cache.popitem(last=False)
+        return vector
+
+    def _all_terms_rare(self, query_text: str, lexicon: InvertedIndex) -> bool:
+        terms = tokenize(query_text)
+        max_df = max(1, int(len(lexicon) * MEMORY_CONFIG["lexical_rare_df"]))
+        return bool(terms) and all(lexicon.doc_freq(t) <= max_df for t in terms)
 
-    def retrieve_relevant(self, query_text: str, top_k: int = 4) -> List[str]:
+    def _is_exact_lookup(self, query_text: str, lexicon: InvertedIndex, lexical) -> bool:
+        if not lexical or lexical[0][2] < 1.0: return False
+        return self._all_terms_rare(query_text, lexicon)
+
+    def retrieve_relevant(self, query_text: str, top_k: int = 4, tenant: Optional[str] = None,
+                          sources: Optional[List[str]] = None, since: Optional[float] = None,
+                          until: Optional[float] = None) -> List[str]:
         try:
-            query_vec = embedding_model.encode(query_text).tolist()
+            partition = self._partition(tenant, create=False)
+            if partition is None: return []
+            db, lexicon = partition
+            filtered = bool(sources) or since is not None or until is not None
+            lexical = lexicon.search(query_text, top_k=top_k * 4)
+            if filtered: lexical = [h for h in lexical if matches_filter(lexicon.meta.get(h[0]), sources, since, until)]
+            if self._is_exact_lookup(query_text, lexicon, lexical):
+                self.stats["lexical_shortcuts"] += 1
+                docs = [lexicon.docs[doc_id] for doc_id, _, cov in lexical if cov >= 1.0][:top_k]
+                self.stats["retrieved_count"] += len(docs)
+                return docs
+            
+            query_vec = self.encode(query_text)
             if self._using == "chroma":
-                results = self.db.query(query_vec, top_k=top_k, threshold=MEMORY_CONFIG["retrieval_threshold"])
-                docs = [r['document'] for r in results]
-            else: docs = self.db.search(query_vec, top_k=top_k)
+                where = build_where(sources, since, until)
+                results = db.query(query_vec, top_k=top_k, threshold=MEMORY_CONFIG["retrieval_threshold"], where=where)
+                vector_hits = [(r['id'], r['document']) for r in results]
+            else:
+                candidates = db.filter_rows(sources, since, until) if filtered else None
+                if (len(db.texts) >= MEMORY_CONFIG["lexical_prefilter_min_docs"] and len(lexical) >= top_k
+                        and self._all_terms_rare(query_text, lexicon)):
+                    candidates = [doc_id for doc_id, _, _ in lexical]
+                    self.stats["prefiltered"] += 1
+                vector_hits = [(i, db.texts[i]) for i, _ in db.search_scored(query_vec, top_k=top_k, candidates=candidates)]
+            
+            docs = self._fuse(vector_hits, lexical, top_k, lexicon)
             self.stats["retrieved_count"] += len(docs)
             return docs
         except Exception as e:
             logging.error(f"[Memory/Retrieval] Failed: {e}")
             return []
 
+    def _fuse(self, vector_hits, lexical, top_k, lexicon):
+        k = MEMORY_CONFIG["rrf_k"]
+        fused, texts = defaultdict(float), {}
+        for rank, (doc_id, text) in enumerate(vector_hits):
+            fused[doc_id] += 1.0 / (k + rank)
+            texts[doc_id] = text
+        strong = [doc_id for doc_id, _, cov in lexical if cov >= 0.5][:top_k]
+        for rank, doc_id in enumerate(strong):
+            fused[doc_id] += 1.0 / (k + rank)
+            texts.setdefault(doc_id, lexicon.docs[doc_id])
+        ranked = sorted(fused, key=fused.get, reverse=True)[:top_k]
+        return [texts[doc_id] for doc_id in ranked]
+
     def get_memory_stats(self) -> dict:
         stats = {
             "backend": self._using,
-            "buffer_size": len(self.buffer),
-            "queue_size": len(self.queue),
+            "buffer_size": sum(len(b) for b in self.buffers.values()),
+            "queue_size": sum(len(q) for q in self.queues.values()),
+            "stm_tenants": len(self.buffers),
             "consolidated": self.stats["consolidated_count"],
-            "retrieved": self.stats["retrieved_count"]
+            "retrieved": self.stats["retrieved_count"],
+            "tenant": self.tenant,
+            "partitions": len(self.partitions),
+            "indexed_terms": sum(len(lex.postings) for _, lex in self.partitions.values()),
+            "lexical_shortcuts": self.stats["lexical_shortcuts"],
+            "prefiltered": self.stats["prefiltered"]
         }
         if self._using == "chroma":
             try: stats["ltm_total"] = self.db.get_stats().get("total_documents", 0)
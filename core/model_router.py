@@ -0,0 +1,85 @@
+import re
+import time
+import logging
+from collections import deque
+from dataclasses import dataclass
+from typing import Dict, Any
+from config.settings import MODEL_CONFIG
+
+COMPLEX_WORDS = re.compile(r"\b(why|how|explain|compare|analy[sz]e|design|difference|step by step|code|debug|error|prove)\b")
+COMPLEX_SYMBOLS = ["```", "def ", "class ", "왜", "어떻게", "为什么", "怎么"]
+
+def estimate_complexity(text: str) -> float:
+    lowered = text.lower()
+    words = len(lowered.split())
+    markers = len(set(COMPLEX_WORDS.findall(lowered))) + sum(1 for m in COMPLEX_SYMBOLS if m in lowered)
+    score = min(1.0, words / 60) * 0.4
+    score += min(1.0, markers / 3) * 0.4
+    score += min(1.0, lowered.count("?") / 2) * 0.1
+    score += 0.1 if "\n" in text else 0.0
+    return round(min(1.0, score), 3)
+
+@dataclass
+class RouteDecision:
+    model: str
+    num_ctx: int
+    temperature: float
+    complexity: float
+    reason: str
+
+    def to_dict(self) -> dict:
+        return {"model": self.model, "num_ctx": self.num_ctx, "complexity": self.complexity, "reason": self.reason}
+
+class ModelRouter:
+    def __init__(self):
+        self.slo = MODEL_CONFIG["ttft_slo"]
+        self.max_queue = MODEL_CONFIG["max_queue_depth"]
+        self.trivial_threshold = MODEL_CONFIG["trivial_threshold"]
+        self.trivial_words = MODEL_CONFIG["trivial_max_words"]
+        self.window = MODEL_CONFIG["latency_window"]
+        self.latencies = {MODEL_CONFIG["model_name"]: deque(maxlen=50), MODEL_CONFIG["fast_model"]: deque(maxlen=50)}
+        self.stats = {"full": 0, "fast": 0, "degraded": 0}
+        self.last_decision = None
+
+    def fixed(self, use_fast: bool) -> RouteDecision:
+        if use_fast:
+            return RouteDecision(MODEL_CONFIG["fast_model"], MODEL_CONFIG["fast_context_window"],
+                                 MODEL_CONFIG["fast_temperature"], 0.0, "fixed")
+        return RouteDecision(MODEL_CONFIG["model_name"], MODEL_CONFIG["context_window"],
+                             MODEL_CONFIG["temperature"], 0.0, "fixed")
+
+    def observe(self, model: str, latency: float):
+        if model in self.latencies: self.latencies[model].append((time.time(), latency))
+
+    def recent_latency(self, model: str) -> float:
+        cutoff = time.time() - self.window
+        samples = sorted(l for ts, l in self.latencies.get(model, []) if ts >= cutoff)
+        if not samples: return 0.0
+        return samples[min(len(samples) - 1, int(len(samples) * 0.9))]
+
+    def route(self, text: str, queue_depth: int = 0) -> RouteDecision:
+        complexity = estimate_complexity(text)
+        full_p90 = self.recent_latency(MODEL_CONFIG["model_name"])
+        
+        if queue_depth >= self.max_queue: use_fast, reason = True, "overload:queue"
+        elif full_p90 > self.slo: use_fast, reason = True, "overload:latency"
+        elif complexity < self.trivial_threshold and len(text.split()) <= self.trivial_words: use_fast, reason = True, "trivial"
+        else: use_fast, reason = False, "default"
+        
+        decision = self.fixed(use_fast)
+        decision.temperature = MODEL_CONFIG["temperature"]
+        decision.complexity, decision.reason = complexity, reason
+        self.stats["fast" if use_fast else "full"] += 1
+        if reason.startswith("overload"):
+            self.stats["degraded"] += 1
+            logging.info(f"[Router] Degraded to {decision.model} ({reason}, depth={queue_depth}, p90={full_p90:.2f}s)")
+        self.last_decision = decision
+        return decision
+
+    def get_stats(self) -> Dict[str, Any]:
+        return {
+            **self.stats,
+            "ttft_slo": self.slo,
+            "p90_ttft": {m: round(self.recent_latency(m), 3) for m in self.latencies},
+            "last_decision": self.last_decision.to_dict() if self.last_decision else None
+        }
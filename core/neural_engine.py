@@ -1,7 +1,38 @@
 import logging
 import json
+import asyncio
+import time
 import ollama
+from typing import Optional, Dict, Any
 from config.settings import MODEL_CONFIG, NEURAL_CONFIG
+from core.model_router import ModelRouter
+
+class Generation:
+    def __init__(self, kind: str, model: str, stream: bool = False):
+        self.kind = kind
+        self.model = model
+        self.task: Optional[asyncio.Task] = None
+        self.queue: Optional[asyncio.Queue] = asyncio.Queue() if stream else None
+        self.tokens = 0
+        self.preempted = False
+        self.started = time.perf_counter()
+        self.latency: Optional[float] = None
+
+    def cancel(self):
+        if self.task is not None and not self.task.done():
+            self.preempted = True
+            self.task.cancel()
+
+    def __aiter__(self):
+        return self
+
+    async def __anext__(self):
+        chunk = await self.queue.get()
+        if chunk is None: raise StopAsyncIteration
+        return chunk
+
+    async def aclose(self):
+        self.cancel()
 
 class DynamicNeuralNetwork:
     def __init__(self):
@@ -10,6 +41,9 @@ class DynamicNeuralNetwork:
         self.fast_model = MODEL_CONFIG["fast_model"]
         self.complexity_level = NEURAL_CONFIG["initial_complexity"]
         self.base_instruction = "You are a helpful AI assistant."
+        self.inflight = set()
+        self.router = ModelRouter()
+        self.gen_stats = {"completed": 0, "cancelled": 0, "delivered_tokens": 0, "wasted_tokens": 0}
 
     def _build_system_prompt(self, hormone_state):
         prompt = self.base_instruction
@@ -30,33 +64,91 @@ class DynamicNeuralNetwork:
             
         return prompt
 
-    async def forward(self, user_input, system_prompt, use_fast=False, stream=False):
-        model = self.fast_model if use_fast else self.model_name
-        temp = MODEL_CONFIG["fast_temperature"] if use_fast else MODEL_CONFIG["temperature"]
+    def route(self, user_input):
+        depth = sum(1 for g in self.inflight if g.kind == "foreground")
+        return self.router.route(user_input, queue_depth=depth)
+
+    async def forward(self, user_input, system_prompt, use_fast=None, stream=False, background=False, route=None):
+        decision = route or (self.route(user_input) if use_fast is None else self.router.fixed(use_fast))
         
         messages = [
             {'role': 'system', 'content': system_prompt},
             {'role': 'user', 'content': user_input}
         ]
+        options = {"temperature": decision.temperature, "num_ctx": decision.num_ctx}
+        return await self._generate(decision.model, messages, "background" if background else "foreground", stream=stream, options=options)
+
+    async def _generate(self, model, messages, kind, stream=False, **kwargs):
+        request = self.client.chat(model=model, messages=messages, stream=True, **kwargs)
+        gen = Generation(kind, model, stream=stream)
         
+        if stream:
+            gen.task = asyncio.create_task(self._pump(request, gen))
+            self._track(gen)
+            return gen
+        
+        gen.task = asyncio.ensure_future(self._complete(request, gen))
+        self._track(gen)
         try:
-            response = await self.client.chat(
-                model=model,
-                messages=messages,
-                stream=stream,
-                options={
-                    "temperature": temp,
-                    "num_ctx": MODEL_CONFIG["context_window"]
-                }
-            )
-            return response if stream else response['message']['content']
+            return await gen.task
+        except asyncio.CancelledError:
+            if not gen.preempted: raise
+            return None
         except Exception as e:
             logging.error(f"LLM Error: {e}")
-            return "..." if not stream else None
+            return "..."
+
+    async def _complete(self, request, gen):
+        content = []
+        async for chunk in await request:
+            if gen.latency is None: gen.latency = time.perf_counter() - gen.started
+            if chunk.get('done'): gen.tokens = chunk.get('eval_count', gen.tokens)
+            else: gen.tokens += 1
+            content.append(chunk['message']['content'])
+        return "".join(content)
+
+    async def _pump(self, request, gen):
+        try:
+            async for chunk in await request:
+                if gen.latency is None: gen.latency = time.perf_counter() - gen.started
+                if chunk.get('done'): gen.tokens = chunk.get('eval_count', gen.tokens)
+                else: gen.tokens += 1
+                gen.queue.put_nowait(chunk)
+        except asyncio.CancelledError: pass
+        except Exception as e: logging.error(f"LLM Stream Error: {e}")
+        finally: gen.queue.put_nowait(None)
+
+    def _track(self, gen):
+        self.inflight.add(gen)
+        gen.task.add_done_callback(lambda _: self._finish(gen))
+
+    def _finish(self, gen):
+        self.inflight.discard(gen)
+        if gen.preempted:
+            self.gen_stats["cancelled"] += 1
+            self.gen_stats["wasted_tokens"] += gen.tokens
+        else:
+            self.gen_stats["completed"] += 1
+            self.gen_stats["delivered_tokens"] += gen.tokens
+            if gen.latency is not None: self.router.observe(gen.model, gen.latency)
+
+    def cancel_generations(self, kind: Optional[str] = None) -> int:
+        targets = [g for g in self.inflight if kind is None or g.kind == kind]
+        for gen in targets: gen.cancel()
+        if targets: logging.info(f"[LLM] Preempted {len(targets)} in-flight generation(s)")
+        return len(targets)
+
+    def get_generation_stats(self) -> Dict[str, Any]:
+        total = self.gen_stats["delivered_tokens"] + self.gen_stats["wasted_tokens"]
+        return {
+            **self.gen_stats,
+            "inflight": len(self.inflight),
+            "waste_ratio": round(self.gen_stats["wasted_tokens"] / total, 3) if total else 0.0
+        }
 
     async def compress_text(self, text):
         prompt = f"Summarize this in one short sentence: '{text}'"
-        return await self.forward(prompt, "Summarizer", use_fast=True)
+        return await self.forward(prompt, "Summarizer", use_fast=True, background=True)
 
     async def extract_facts(self, text):
         prompt = (
@@ -72,13 +164,15 @@ class DynamicNeuralNetwork:
         )
         
         try:
-            res = await self.client.chat(
-                model=self.fast_model,
-                messages=[{'role': 'user', 'content': prompt}],
-                format='json', 
+            content = await self._generate(
+                self.fast_model,
+                [{'role': 'user', 'content': prompt}],
+                "foreground",
+                format='json',
                 options={"temperature": 0.1, "seed": 42}
             )
-            result = json.loads(res['message']['content'])
+            if content is None: return {}
+            result = json.loads(content)
             
             if result.get("new_name"):
                 name = result["new_name"].strip()
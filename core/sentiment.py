@@ -0,0 +1,59 @@
+import logging
+import numpy as np
+from typing import List, Union
+from config.settings import SENTIMENT_CONFIG
+
+PROTOTYPES = {
+    "positive": [
+        "I love this, thank you so much!",
+        "That works perfectly, great job.",
+        "This is amazing, I'm really happy.",
+        "Wow, you are so helpful.",
+        "Awesome, that's exactly what I needed.",
+        "I'm excited and feeling good today.",
+    ],
+    "negative": [
+        "You are useless, fix this now!",
+        "I hate this, it's terrible.",
+        "This is wrong again, I'm so angry.",
+        "That didn't work at all, what a waste of time.",
+        "I'm frustrated and disappointed.",
+        "Stop making mistakes, this is awful.",
+    ],
+    "neutral": [
+        "What time is it?",
+        "Tell me about the weather.",
+        "My name is Alex.",
+        "Can you summarize this text?",
+        "I work as an engineer.",
+        "Hello.",
+    ],
+}
+
+class SentimentScorer:
+    def __init__(self, encoder):
+        self.labels = list(PROTOTYPES.keys())
+        centroids = []
+        for label in self.labels:
+            vecs = self._normalize(np.asarray(encoder.encode(PROTOTYPES[label]), dtype=np.float32))
+            centroids.append(vecs.mean(axis=0))
+        self.centroids = self._normalize(np.stack(centroids))
+        self.temperature = SENTIMENT_CONFIG["temperature"]
+        self.pos_idx, self.neg_idx = self.labels.index("positive"), self.labels.index("negative")
+        logging.info(f"[Sentiment] Prototype centroids ready: {self.labels}")
+
+    @staticmethod
+    def _normalize(vectors: np.ndarray) -> np.ndarray:
+        norms = np.linalg.norm(vectors, axis=-1, keepdims=True)
+        return vectors / np.where(norms == 0, 1.0, norms)
+
+    def score_batch(self, vectors: Union[np.ndarray, List[List[float]]]) -> np.ndarray:
+        sims = self._normalize(np.asarray(vectors, dtype=np.float32)) @ self.centroids.T
+        logits = sims * self.temperature
+        probs = np.exp(logits - logits.max(axis=1, keepdims=True))
+        probs /= probs.sum(axis=1, keepdims=True)
+        scores = probs[:, self.pos_idx] - probs[:, self.neg_idx] + SENTIMENT_CONFIG["bias"]
+        return np.clip(scores, -1.0, 1.0)
+
+    def score(self, vector: Union[np.ndarray, List[float]]) -> float:
+        return float(self.score_batch(np.asarray(vector, dtype=np.float32)[None, :])[0])
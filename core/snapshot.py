@@ -0,0 +1,213 @@
+import os
+import json
+import time
+import zlib
+import copy
+import struct
+import asyncio
+import logging
+from typing import Optional, Dict, Any
+from config.settings import PERSISTENCE_CONFIG, MEMORY_CONFIG
+from core.hormone_system import HormoneState
+from core.locks import acquire_lock, release_lock, lock_owner
+
+MAGIC = b"HSEA"
+VERSION = 2
+HEADER = struct.Struct("<4sBI")
+
+def encode_snapshot(state: dict) -> bytes:
+    payload = zlib.compress(json.dumps(state, ensure_ascii=False, separators=(",", ":")).encode("utf-8"), 1)
+    return HEADER.pack(MAGIC, VERSION, zlib.crc32(payload)) + payload
+
+def decode_snapshot(blob: bytes) -> Optional[dict]:
+    if len(blob) < HEADER.size: return None
+    magic, version, crc = HEADER.unpack_from(blob)
+    payload = blob[HEADER.size:]
+    if magic != MAGIC or version != VERSION or zlib.crc32(payload) != crc: return None
+    return json.loads(zlib.decompress(payload).decode("utf-8"))
+
+def read_wal(wal_file: str) -> list:
+    if not os.path.exists(wal_file): return []
+    records = []
+    with open(wal_file, "r", encoding="utf-8") as f:
+        for line in f:
+            try: records.append(json.loads(line))
+            except ValueError: break
+    return records
+
+def apply_record(buffers: dict, queues: dict, record: dict, max_buffer: int):
+    op, args = record["op"], record["args"]
+    tenant = args[-1]
+    queue = queues.setdefault(tenant, [])
+    if op == "buffer":
+        buffer = buffers.setdefault(tenant, [])
+        buffer.append(f"{args[0]}: {args[1]}")
+        if len(buffer) > max_buffer: queue.append(buffer.pop(0))
+    elif op == "flush": queue.extend(buffers.pop(tenant, []))
+    elif op == "enqueue": queue.append(args[0])
+    elif op == "ack" and args[0] in queue: queue.remove(args[0])
+    if not queue: queues.pop(tenant)
+
+def load_state(snapshot_file: str, wal_file: str, max_buffer: int = MEMORY_CONFIG["stm_buffer_size"]) -> Optional[dict]:
+    state = None
+    if os.path.exists(snapshot_file):
+        with open(snapshot_file, "rb") as f: state = decode_snapshot(f.read())
+    records = read_wal(wal_file)
+    if state is None and not records: return None
+    state = state or {"seq": 0, "memory": {"buffers": {}, "queues": {}}}
+    for record in records:
+        if record["seq"] <= state["seq"]: continue
+        apply_record(state["memory"]["buffers"], state["memory"]["queues"], record, max_buffer)
+        state["seq"] = record["seq"]
+    return state
+
+def write_state(snapshot_file: str, state: dict) -> int:
+    return write_blob(snapshot_file, encode_snapshot(state))
+
+def write_blob(snapshot_file: str, blob: bytes) -> int:
+    tmp = snapshot_file + ".tmp"
+    with open(tmp, "wb") as f:
+        f.write(blob)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp, snapshot_file)
+    return len(blob)
+
+def lock_path(wal_file: str) -> str:
+    return wal_file + ".lock"
+
+class SnapshotManager:
+    def __init__(self, hormones, memory, network, profile, global_state,
+                 snapshot_file=PERSISTENCE_CONFIG["snapshot_file"], wal_file=PERSISTENCE_CONFIG["wal_file"]):
+        self.hormones = hormones
+        self.memory = memory
+        self.net = network
+        self.profile = profile
+        self.global_state = global_state
+        self.snapshot_file = snapshot_file
+        self.wal_file = wal_file
+        self.seq = 0
+        self._wal = None
+        self._pending = []
+        self._last_crc = None
+        self._lock = None
+        self._wal_lock = None
+        self.stats = {"snapshots": 0, "skipped": 0, "wal_records": 0, "replayed": 0,
+                      "last_size": 0, "last_save_ms": 0.0, "last_restore_ms": 0.0}
+
+    def lock(self):
+        if self._wal_lock is not None: return
+        self._wal_lock = acquire_lock(lock_path(self.wal_file))
+        if self._wal_lock is None:
+            raise RuntimeError(f"WAL {self.wal_file} is locked by process {lock_owner(lock_path(self.wal_file))}")
+
+    def attach(self):
+        self.lock()
+        self._wal = open(self.wal_file, "a", encoding="utf-8")
+        self.memory.wal = self.log
+
+    def close(self):
+        self.memory.wal = None
+        if self._wal: self._wal.close()
+        self._wal = None
+        release_lock(self._wal_lock)
+        self._wal_lock = None
+
+    def log(self, op: str, *args):
+        self.seq += 1
+        line = json.dumps({"seq": self.seq, "op": op, "args": args}, ensure_ascii=False) + "\n"
+        self._pending.append((self.seq, line))
+        self._wal.write(line)
+        self._wal.flush()
+        if PERSISTENCE_CONFIG["wal_fsync"]: os.fsync(self._wal.fileno())
+        self.stats["wal_records"] += 1
+
+    def capture(self) -> dict:
+        return {
+            "seq": self.seq,
+            "hormones": {
+                "stress": self.hormones.stress,
+                "reward": self.hormones.reward,
+                "stability": self.hormones.stability,
+                "history": [[h.stress, h.reward, h.stability] for h in self.hormones.history],
+            },
+            "memory": {
+                "buffers": {t: list(b) for t, b in self.memory.buffers.items()},
+                "queues": {t: list(self.memory.consolidating.get(t, [])) + list(q) for t, q in self.memory.queues.items()},
+            },
+            "complexity_level": self.net.complexity_level,
+            "profile": copy.deepcopy(self.profile.data),
+            "global_state": {"last_evolve_time": self.global_state.get("last_evolve_time", 0)},
+        }
+
+    def _write(self, state: dict, force: bool):
+        start = time.perf_counter()
+        blob = encode_snapshot(state)
+        crc = zlib.crc32(blob)
+        if crc == self._last_crc and not force: return None
+        size = write_blob(self.snapshot_file, blob)
+        self._last_crc = crc
+        return size, (time.perf_counter() - start) * 1000
+
+    async def save(self, force: bool = False) -> bool:
+        if self._lock is None: self._lock = asyncio.Lock()
+        async with self._lock:
+            state = self.capture()
+            try: result = await asyncio.to_thread(self._write, state, force)
+            except Exception as e:
+                logging.error(f"[Snapshot] Save failed: {e}")
+                return False
+            if result is None:
+                self.stats["skipped"] += 1
+                return False
+            self.stats["last_size"], self.stats["last_save_ms"] = result[0], round(result[1], 2)
+            self.stats["snapshots"] += 1
+            self._truncate_wal(state["seq"])
+            logging.debug(f"[Snapshot] Saved seq={state['seq']} ({result[0]} bytes, {result[1]:.1f} ms)")
+            return True
+
+    def _truncate_wal(self, upto: int):
+        self._pending = [(seq, line) for seq, line in self._pending if seq > upto]
+        if self._wal is None: return
+        tmp = self.wal_file + ".tmp"
+        with open(tmp, "w", encoding="utf-8") as f: f.writelines(line for _, line in self._pending)
+        self._wal.close()
+        os.replace(tmp, self.wal_file)
+        self._wal = open(self.wal_file, "a", encoding="utf-8")
+
+    def restore(self) -> float:
+        start = time.perf_counter()
+        state = None
+        if os.path.exists(self.snapshot_file):
+            try:
+                with open(self.snapshot_file, "rb") as f: state = decode_snapshot(f.read())
+                if state is None: logging.warning("[Snapshot] Snapshot corrupt, replaying WAL only")
+            except Exception as e: logging.error(f"[Snapshot] Load failed: {e}")
+        
+        if state:
+            h = state["hormones"]
+            self.hormones.stress, self.hormones.reward, self.hormones.stability = h["stress"], h["reward"], h["stability"]
+            self.hormones.history = [HormoneState(*entry) for entry in h["history"]]
+            self.memory.buffers = {t: list(b) for t, b in state["memory"]["buffers"].items()}
+            self.memory.queues = {t: list(q) for t, q in state["memory"]["queues"].items()}
+            self.net.complexity_level = state["complexity_level"]
+            if not os.path.exists(self.profile.filepath): self.profile.data = state["profile"]
+            self.global_state.update(state["global_state"])
+            self.seq = state["seq"]
+        
+        for record in read_wal(self.wal_file):
+            if record["seq"] <= self.seq: continue
+            apply_record(self.memory.buffers, self.memory.queues, record, self.memory.max_buffer)
+            self._pending.append((record["seq"], json.dumps(record, ensure_ascii=False) + "\n"))
+            self.seq = record["seq"]
+            self.stats["replayed"] += 1
+        
+        elapsed = (time.perf_counter() - start) * 1000
+        self.stats["last_restore_ms"] = round(elapsed, 2)
+        logging.info(f"[Snapshot] Restored seq={self.seq} (buffer={sum(map(len, self.memory.buffers.values()))}, "
+                     f"queue={sum(map(len, self.memory.queues.values()))}, "
+                     f"replayed={self.stats['replayed']}) in {elapsed:.2f} ms")
+        return elapsed
+
+    def get_stats(self) -> Dict[str, Any]:
+        return {**self.stats, "seq": self.seq, "pending_wal": len(self._pending)}
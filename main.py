@@ -12,10 +12,12 @@ from fastapi.templating import Jinja2Templates
 import uvicorn
 
 from core.hormone_system import HormoneModulator
-from core.memory_system import ContextManager, ProfileManager
+from core.memory_system import ContextManager, ProfileManager, embedding_model
+from core.sentiment import SentimentScorer
 from core.neural_engine import DynamicNeuralNetwork
 from core.inference_loop import InferenceEngine
-from config.settings import BEHAVIOR_CONFIG, LOG_CONFIG, MEMORY_CONFIG
+from core.snapshot import SnapshotManager
+from config.settings import BEHAVIOR_CONFIG, LOG_CONFIG, MEMORY_CONFIG, PERSISTENCE_CONFIG
 
 logging.basicConfig(level=LOG_CONFIG["level"], format=LOG_CONFIG["format"])
 app = FastAPI()
@@ -26,6 +28,7 @@ memory_ctx = ContextManager()
 profile_mgr = ProfileManager()
 neural_net = DynamicNeuralNetwork()
 brain = InferenceEngine(neural_net, memory_ctx, hormone_sys, profile_mgr)
+sentiment_scorer = SentimentScorer(embedding_model)
 
 class ConnectionManager:
     def __init__(self):
@@ -48,8 +51,10 @@ global_state = {
     "status": "IDLE",
     "last_active": time.time(),
     "interrupted": False,
-    "last_evolve_time": 0
+    "last_evolve_time": 0,
+    "last_snapshot": time.time()
 }
+snapshots = SnapshotManager(hormone_sys, memory_ctx, neural_net, profile_mgr, global_state)
 
 def is_interrupted(): return global_state["interrupted"]
 
@@ -67,6 +72,10 @@ async def life_cycle_loop():
         })
 
         now = time.time()
+        if now - global_state["last_snapshot"] > PERSISTENCE_CONFIG["snapshot_interval"]:
+            global_state["last_snapshot"] = now
+            await snapshots.save()
+
         if now - global_state["last_evolve_time"] > BEHAVIOR_CONFIG["evolve_cooldown"]:
             if suggested_state.value in ["EXPAND", "PRUNE"]:
                 neural_net.evolve(suggested_state.value)
@@ -81,10 +90,11 @@ async def life_cycle_loop():
                     await manager.broadcast({"type": "log", "msg": "✨ Initiating conversation..."})
                     facts = profile_mgr.data.get('facts', [])
                     prompt = f"Ask a follow-up about {facts[-1]}. One sentence." if facts else "Ask a friendly question to learn about the user. One sentence."
-                    msg = await neural_net.forward(prompt, "You are curious and friendly.", use_fast=True)
-                    await manager.broadcast({"type": "agent_msg", "text": msg})
-                    memory_ctx.add_to_buffer("Agent", msg)
-                    global_state["last_active"] = now
+                    msg = await neural_net.forward(prompt, "You are curious and friendly.", use_fast=True, background=True)
+                    if msg is not None:
+                        await manager.broadcast({"type": "agent_msg", "text": msg})
+                        memory_ctx.add_to_buffer("Agent", msg)
+                        global_state["last_active"] = now
                     global_state["status"] = "IDLE"
 
             elif idle_time > BEHAVIOR_CONFIG["dream_idle_min"] and state['stress'] < 0.4:
@@ -97,8 +107,18 @@ async def life_cycle_loop():
 
 @app.on_event("startup")
 async def startup():
+    memory_ctx.lock_store()
+    snapshots.lock()
+    snapshots.restore()
+    snapshots.attach()
     asyncio.create_task(life_cycle_loop())
 
+@app.on_event("shutdown")
+async def shutdown():
+    await snapshots.save(force=True)
+    snapshots.close()
+    memory_ctx.unlock_store()
+
 @app.get("/", response_class=HTMLResponse)
 async def get_ui(request: Request):
     return templates.TemplateResponse("index.html", {"request": request})
@@ -110,54 +130,67 @@ async def get_status():
         "hormones": hormone_sys.get_state(),
         "diagnostics": hormone_sys.get_diagnostics(),
         "memory": memory_ctx.get_memory_stats(),
+        "llm": neural_net.get_generation_stats(),
+        "router": neural_net.router.get_stats(),
+        "context": brain.context.get_stats(),
+        "persistence": snapshots.get_stats(),
         "profile": {"name": profile_mgr.data.get("name", "Nova"), "facts_count": len(profile_mgr.data.get("facts", []))}
     }
 
 @app.websocket("/ws")
 async def websocket_endpoint(websocket: WebSocket):
     await manager.connect(websocket)
+    tenant = websocket.query_params.get("session", MEMORY_CONFIG["default_tenant"])
+    session = {"interrupted": False}
+    inbox = asyncio.Queue()
+    
+    async def receive():
+        try:
+            while True:
+                user_msg = json.loads(await websocket.receive_text()).get("message")
+                if not user_msg: continue
+                session["interrupted"] = True
+                global_state["interrupted"] = True
+                neural_net.cancel_generations("background")
+                global_state["last_active"] = time.time()
+                await inbox.put(user_msg)
+        except WebSocketDisconnect: pass
+        finally: inbox.put_nowait(None)
+    
+    receiver = asyncio.create_task(receive())
     try:
         while True:
-            data = await websocket.receive_text()
-            msg_data = json.loads(data)
-            user_msg = msg_data.get("message")
-            if not user_msg: continue
-            
-            global_state["interrupted"] = True
-            global_state["last_active"] = time.time()
+            user_msg = await inbox.get()
+            if user_msg is None: break
             global_state["status"] = "THINKING"
             
-            sentiment = 0.1
-            if any(w in user_msg.lower() for w in ["bad", "hate", "terrible", "angry"]): sentiment = -0.7
-            elif any(w in user_msg.lower() for w in ["good", "love", "great", "happy"]): sentiment = 0.8
+            sentiment = sentiment_scorer.score(memory_ctx.encode(user_msg))
             
             s_delta, r_delta, st_delta = hormone_sys.evaluate_state(sentiment)
             hormone_sys.update_hormones(s_delta, r_delta, st_delta)
             
-            memory_ctx.add_to_buffer("User", user_msg)
-            relevant = memory_ctx.retrieve_relevant(user_msg, top_k=3)
+            relevant = memory_ctx.retrieve_relevant(user_msg, top_k=3, tenant=tenant)
             if relevant:
                 await manager.broadcast({"type": "log", "msg": f"📚 Retrieved: {relevant[0][:50]}..."})
             
             current_hormones = hormone_sys.get_state()
             if current_hormones['stress'] < 0.6:
-                thought = await neural_net.forward(f"Think briefly about: '{user_msg}'", "One short inner voice sentence.", use_fast=True)
-                await manager.broadcast({"type": "thought", "text": thought})
+                thought = await neural_net.forward(f"Think briefly about: '{user_msg}'", "One short inner voice sentence.", use_fast=True, background=True)
+                if thought is not None: await manager.broadcast({"type": "thought", "text": thought})
             
-            memory_ctx.add_to_buffer("Agent", "[generating...]")
-            global_state["interrupted"] = False
-            collected = ""
-            async for token in brain.run_chat(user_msg, is_interrupted):
+            session["interrupted"] = False
+            async for token in brain.run_chat(user_msg, lambda: session["interrupted"], tenant=tenant):
                 if token == "[Interrupted]": break
-                collected += token
                 await websocket.send_json({"type": "stream", "token": token})
             
-            if collected: memory_ctx.buffer[-1] = f"Agent: {collected}"
             await websocket.send_json({"type": "stream_end"})
             global_state["status"] = "IDLE"
-            asyncio.create_task(memory_ctx.process_queue(neural_net))
+            asyncio.create_task(memory_ctx.process_queue(neural_net, tenant=tenant))
             
-    except WebSocketDisconnect: manager.disconnect(websocket)
+    except WebSocketDisconnect: pass
+    finally:
+        receiver.cancel()
+        manager.disconnect(websocket)
 
 if __name__ == "__main__":
     uvicorn.run(app, host="0.0.0.0", port=8000)
\ No newline at end of file
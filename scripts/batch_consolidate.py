@@ -0,0 +1,176 @@
+#!/usr/bin/env python3
+import sys
+import json
+import time
+import asyncio
+import logging
+import argparse
+from pathlib import Path
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor, as_completed
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+logging.basicConfig(level=logging.INFO, format="%(asctime)s - [%(levelname)s] - %(message)s")
+logger = logging.getLogger(__name__)
+
+from config.settings import MEMORY_CONFIG
+from core.memory_system import ContextManager, embedding_model
+from core.neural_engine import DynamicNeuralNetwork
+from core.inference_loop import dream_topic
+from core.snapshot import load_state, lock_path
+from core.locks import acquire_lock, release_lock, lock_owner
+
+def find_snapshots(paths):
+    found = []
+    for p in map(Path, paths):
+        if p.is_dir(): found.extend(sorted(p.glob("*.snap")) + sorted(w for w in p.glob("*.wal") if not w.with_suffix(".snap").exists()))
+        else: found.append(p)
+    return found
+
+async def summarize_all(texts, dreams, hormones, concurrency):
+    net = DynamicNeuralNetwork()
+    sem = asyncio.Semaphore(concurrency)
+    
+    async def bounded(coro):
+        async with sem: return await coro
+    
+    dream_texts = []
+    if dreams:
+        topic = dream_topic(hormones)
+        raw = await asyncio.gather(*[bounded(net.forward(f"Describe a scene about {topic}.", "You are dreaming. Be creative.", use_fast=True))
+                                     for _ in range(dreams)])
+        dream_texts = [f"Dream ({topic}): {d}" for d in raw if d and d != "..."]
+    
+    jobs = [(t, "consolidation") for t in texts] + [(t, "dream") for t in dream_texts]
+    summaries = await asyncio.gather(*[bounded(net.compress_text(t)) for t, _ in jobs])
+    return [(t, src, s) for (t, src), s in zip(jobs, summaries)], net.get_generation_stats()
+
+def consolidate_agent(job):
+    start = time.perf_counter()
+    results, llm_stats = asyncio.run(summarize_all(job["queue"], job["dreams"], job["hormones"], job["concurrency"]))
+    llm_s = time.perf_counter() - start
+    
+    done = [(text, src, summary) for text, src, summary in results if summary not in (None, "...")]
+    failed = [text for text, src, summary in results if summary in (None, "...") and src == "consolidation"]
+    
+    start = time.perf_counter()
+    vectors = embedding_model.encode([summary for _, _, summary in done], batch_size=64).tolist() if done else []
+    embed_s = time.perf_counter() - start
+    
+    return {
+        "path": job["path"], "wal": job["wal"], "store": job["store"], "tenant": job["tenant"], "queue_tenant": job["queue_tenant"],
+        "items": [(summary, vec, src) for (_, src, summary), vec in zip(done, vectors)],
+        "acked": [text for text, src, _ in done if src == "consolidation"],
+        "failed": failed, "llm_s": llm_s, "embed_s": embed_s, "tokens": llm_stats["delivered_tokens"]
+    }
+
+def store_dir(path, store_root=None) -> Path:
+    return Path(store_root) / path.stem if store_root else path.parent
+
+def open_store(directory: Path, use_chroma: bool) -> ContextManager:
+    directory.mkdir(parents=True, exist_ok=True)
+    return ContextManager(use_chroma=use_chroma,
+                          chroma_persist_dir=str(directory / Path(MEMORY_CONFIG["chroma_persist_dir"]).name),
+                          memory_db_file=str(directory / Path(MEMORY_CONFIG["memory_db_file"]).name))
+
+def ack_consolidated(wal_file, seq, texts, tenant):
+    with open(wal_file, "a", encoding="utf-8") as f:
+        for text in texts:
+            seq += 1
+            f.write(json.dumps({"seq": seq, "op": "ack", "args": [text, tenant]}, ensure_ascii=False) + "\n")
+    return seq
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Offline consolidation/dreaming over agent snapshots. WALs locked by a serving agent are skipped.")
+    parser.add_argument("paths", nargs="+", help="Snapshot files (.snap/.wal) or directories containing them")
+    parser.add_argument("--workers", type=int, default=4, help="Process pool size (0 runs agents in-process)")
+    parser.add_argument("--concurrency", type=int, default=4, help="In-flight LLM requests per worker")
+    parser.add_argument("--dreams", type=int, default=0, help="Dreams to generate per agent")
+    parser.add_argument("--tenant", default=None, help="Write every queue into this tenant instead of the tenant it was queued for")
+    parser.add_argument("--numpy", action="store_true", help="Write to the NumPy store instead of Chroma")
+    parser.add_argument("--store-root", default=None,
+                        help="Write each agent's memories under STORE_ROOT/<snapshot name>/ instead of the snapshot's own directory")
+    parser.add_argument("--dry-run", action="store_true", help="Summarize and embed but do not write or ack")
+    args = parser.parse_args(argv)
+    
+    locked = []
+    try: return run(args, locked)
+    finally:
+        for fd in locked: release_lock(fd)
+
+def run(args, locked):
+    paths = find_snapshots(args.paths)
+    stores = {}
+    for path in paths:
+        other = stores.setdefault(store_dir(path, args.store_root).resolve(), path)
+        if other.resolve() != path.resolve():
+            logger.error(f"{other} and {path} would share one memory store; pass --store-root to keep agents apart")
+            return 2
+    
+    jobs, busy = [], 0
+    for path in paths:
+        snap, wal = str(path.with_suffix(".snap")), str(path.with_suffix(".wal"))
+        store = store_dir(path, args.store_root)
+        store_lock = str(store / Path(MEMORY_CONFIG["memory_db_file"]).name) + ".lock"
+        if not args.dry_run:
+            store.mkdir(parents=True, exist_ok=True)
+            held = True
+            for lock_file, what in ((lock_path(wal), "WAL"), (store_lock, "memory store")):
+                fd = acquire_lock(lock_file)
+                if fd is None:
+                    logger.error(f"Skipping {path}: {what} is in use by process {lock_owner(lock_file)}")
+                    held = False
+                    break
+                locked.append(fd)
+            if not held:
+                busy += 1
+                continue
+        state = load_state(snap, wal)
+        if state is None: continue
+        queues = dict(state["memory"]["queues"])
+        if args.dreams: queues.setdefault(MEMORY_CONFIG["default_tenant"], [])
+        for queue_tenant, queue in queues.items():
+            dreams = args.dreams if queue_tenant == MEMORY_CONFIG["default_tenant"] else 0
+            if not queue and not dreams: continue
+            jobs.append({"path": str(path), "wal": wal, "store": str(store), "seq": state["seq"], "tenant": args.tenant or queue_tenant,
+                         "queue_tenant": queue_tenant, "queue": queue, "dreams": dreams,
+                         "hormones": state.get("hormones", {"stress": 0.0}), "concurrency": args.concurrency})
+    if not jobs:
+        logger.info("Nothing to consolidate.")
+        return 1 if busy else 0
+    
+    logger.info(f"Consolidating {sum(len(j['queue']) for j in jobs)} queued memories across {len(jobs)} agent queues "
+                f"({args.workers} workers x {args.concurrency} LLM slots)")
+    memories = {}
+    seqs = {j["path"]: j["seq"] for j in jobs}
+    totals = {"agents_failed": 0, "stored": 0, "acked": 0, "failed": 0, "tokens": 0, "llm_s": 0.0, "embed_s": 0.0, "write_s": 0.0}
+    start = time.perf_counter()
+    
+    pool = ProcessPoolExecutor(max_workers=args.workers) if args.workers > 0 else ThreadPoolExecutor(max_workers=1)
+    with pool:
+        futures = [pool.submit(consolidate_agent, job) for job in jobs]
+        for future in as_completed(futures):
+            try: res = future.result()
+            except Exception as e:
+                logger.error(f"Agent failed: {e}")
+                totals["agents_failed"] += 1
+                continue
+            if not args.dry_run:
+                t0 = time.perf_counter()
+                if res["store"] not in memories: memories[res["store"]] = open_store(Path(res["store"]), not args.numpy)
+                totals["stored"] += memories[res["store"]].add_memories(res["items"], tenant=res["tenant"])
+                seqs[res["path"]] = ack_consolidated(res["wal"], seqs[res["path"]], res["acked"], res["queue_tenant"])
+                totals["write_s"] += time.perf_counter() - t0
+            totals["acked"] += len(res["acked"])
+            totals["failed"] += len(res["failed"])
+            for key in ("tokens", "llm_s", "embed_s"): totals[key] += res[key]
+            logger.info(f"[{res['tenant']}] {len(res['items'])} memories, {len(res['failed'])} left queued")
+    
+    elapsed = time.perf_counter() - start
+    processed = totals["acked"] + totals["failed"]
+    logger.info(f"Done in {elapsed:.1f}s: {totals['stored']} stored, {totals['acked']} acked, {totals['failed']} failed")
+    logger.info(f"Throughput: {processed / elapsed:.2f} items/s, {totals['tokens'] / elapsed:.1f} LLM tokens/s "
+                f"(worker LLM {totals['llm_s']:.1f}s, embed {totals['embed_s']:.1f}s, write {totals['write_s']:.2f}s)")
+    return 0 if totals["failed"] == 0 and totals["agents_failed"] == 0 and not busy else 1
+
+if __name__ == "__main__":
+    sys.exit(main())
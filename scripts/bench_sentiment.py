@@ -0,0 +1,46 @@
+#!/usr/bin/env python3
+import sys
+import time
+import logging
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+logging.basicConfig(level=logging.INFO, format="%(asctime)s - [%(levelname)s] - %(message)s")
+logger = logging.getLogger(__name__)
+
+import numpy as np
+from core.memory_system import embedding_model
+from core.sentiment import SentimentScorer
+
+MESSAGES = [
+    "You are useless! Fix this code!",
+    "Wow, that works perfectly.",
+    "What did we talk about yesterday?",
+    "I love how you explained that, thanks!",
+    "This is the third time it failed, I'm furious.",
+    "My favourite language is Python.",
+]
+
+def timed(fn, repeats):
+    start = time.perf_counter()
+    for _ in range(repeats): fn()
+    return (time.perf_counter() - start) / repeats * 1000
+
+def main(repeats=200):
+    scorer = SentimentScorer(embedding_model)
+    vectors = np.asarray(embedding_model.encode(MESSAGES), dtype=np.float32)
+    for msg, score in zip(MESSAGES, scorer.score_batch(vectors)):
+        logger.info(f"{score:+.3f}  {msg}")
+    
+    encode_ms = timed(lambda: embedding_model.encode(MESSAGES[0]), 20)
+    single_ms = timed(lambda: scorer.score(vectors[0]), repeats)
+    batch = np.repeat(vectors, 1000 // len(MESSAGES) + 1, axis=0)[:1000]
+    batch_ms = timed(lambda: scorer.score_batch(batch), 20) / len(batch)
+    
+    logger.info(f"Embedding (already paid by retrieval): {encode_ms:.3f} ms/msg")
+    logger.info(f"Sentiment on reused vector: {single_ms:.4f} ms/msg ({single_ms / encode_ms:.2%} of an embedding)")
+    logger.info(f"Sentiment batch path: {batch_ms:.5f} ms/msg over {len(batch)} msgs")
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -3,6 +3,7 @@ import asyncio
 import logging
 import sys
 import json
+import time
 from pathlib import Path
 
 logging.basicConfig(level=logging.INFO, format="%(asctime)s - [%(levelname)s] - %(message)s")
@@ -10,8 +11,14 @@ logger = logging.getLogger(__name__)
 
 try:
     from core.hormone_system import HormoneModulator, AgentState
-    from core.memory_system import ContextManager, ProfileManager
+    from core.memory_system import ContextManager, ProfileManager, InvertedIndex
     from core.chroma_store import ChromaStore
+    from core.neural_engine import DynamicNeuralNetwork
+    from core.model_router import ModelRouter
+    from core.sentiment import SentimentScorer
+    from core.snapshot import SnapshotManager
+    from core.locks import acquire_lock, release_lock
+    from core.context_builder import ContextBuilder, TokenCounter
     logger.info("✓ All modules imported successfully")
 except Exception as e:
     logger.error(f"✗ Import failed: {e}")
@@ -68,6 +75,104 @@ def test_memory_system():
         traceback.print_exc()
         return False
 
+def test_memory_partitions():
+    logger.info("="*30 + " Memory Partitions " + "="*30)
+    try:
+        memory_ctx = ContextManager(use_chroma=False, tenant="test_a")
+        memory_ctx.add_memory("The user has a dog named Rex", memory_ctx.encode("The user has a dog named Rex"))
+        memory_ctx.add_memory("Dream about a dog in a neon city", memory_ctx.encode("Dream about a dog in a neon city"), source="dream")
+        memory_ctx.add_memory("The user plays the cello", memory_ctx.encode("The user plays the cello"), tenant="test_b")
+        assert memory_ctx.retrieve_relevant("cello") == []
+        assert memory_ctx.retrieve_relevant("cello", tenant="test_b") == ["The user plays the cello"]
+        assert memory_ctx.retrieve_relevant("dog", sources=["dream"]) == ["Dream about a dog in a neon city"]
+        assert memory_ctx.retrieve_relevant("dog", since=time.time() + 60) == []
+        logger.info(f"Partition stats: {memory_ctx.get_memory_stats()}")
+        logger.info("✓ Memory partitions test PASSED\n")
+        return True
+    except Exception as e:
+        logger.error(f"✗ Memory partitions test FAILED: {e}")
+        return False
+
+class _EchoSummarizer:
+    async def compress_text(self, text):
+        return text
+
+def test_tenant_isolation():
+    logger.info("="*30 + " Tenant Isolation " + "="*30)
+    try:
+        from core.memory_system import partition_key
+        memory_ctx = ContextManager(use_chroma=False, tenant="test_iso")
+        for i in range(memory_ctx.max_buffer + 1): memory_ctx.add_to_buffer("User", f"alice secret {i}", tenant="test_alice")
+        asyncio.run(memory_ctx.process_queue(_EchoSummarizer(), tenant="test_bob"))
+        assert memory_ctx.get_recent_turns(10, tenant="test_bob") == []
+        assert memory_ctx.retrieve_relevant("alice secret", tenant="test_bob") == []
+        asyncio.run(memory_ctx.process_queue(_EchoSummarizer(), tenant="test_alice"))
+        assert memory_ctx.retrieve_relevant("alice secret", tenant="test_alice") == ["User: alice secret 0"]
+        assert "test_bob" not in memory_ctx.partitions and not Path(memory_ctx._shard_file("test_bob")).exists()
+        keys = [partition_key(t) for t in ("alice.smith", "alice_smith", "bob_", "--")]
+        assert len(set(keys)) == 4 and all(k[-1].isalnum() and partition_key(k) == k for k in keys)
+        
+        from config.settings import MEMORY_CONFIG
+        limits = MEMORY_CONFIG["max_open_partitions"], MEMORY_CONFIG["max_stm_tenants"]
+        MEMORY_CONFIG["max_open_partitions"], MEMORY_CONFIG["max_stm_tenants"] = 2, 2
+        try:
+            for t in ("test_lru1", "test_lru2"):
+                memory_ctx.add_memory(f"{t} memory", memory_ctx.encode(t), tenant=t)
+                memory_ctx.add_to_buffer("User", f"hello from {t}", tenant=t)
+        finally: MEMORY_CONFIG["max_open_partitions"], MEMORY_CONFIG["max_stm_tenants"] = limits
+        assert list(memory_ctx.partitions) == ["test_iso", "test_lru2"]
+        assert memory_ctx.retrieve_relevant("test_lru1 memory", tenant="test_lru1") == ["test_lru1 memory"]
+        assert list(memory_ctx.buffers) == ["test_iso", "test_lru2"] and memory_ctx.queues["test_lru1"] == ["User: hello from test_lru1"]
+        logger.info("✓ Tenant isolation test PASSED\n")
+        return True
+    except Exception as e:
+        logger.error(f"✗ Tenant isolation test FAILED: {e}")
+        return False
+    finally:
+        for f in Path(".").glob("memory_db.test_*.json"): f.unlink()
+
+def test_paraphrase_retrieval():
+    logger.info("="*30 + " Paraphrase Retrieval " + "="*30)
+    try:
+        import numpy as np
+        for f in Path(".").glob("memory_db.test_paraphrase*.json"): f.unlink()
+        memory_ctx = ContextManager(use_chroma=False, tenant="test_paraphrase")
+        rng = np.random.default_rng(0)
+        query = "Does the user like kittens?"
+        query_vec = np.asarray(memory_ctx.encode(query), dtype=np.float32)
+        fillers = [(f"The user would like reminder number {i}", rng.normal(size=query_vec.shape).tolist(), "consolidation")
+                   for i in range(2000)]
+        memory_ctx.add_memories(fillers)
+        target_vec = (query_vec + rng.normal(scale=0.01, size=query_vec.shape)).tolist()
+        memory_ctx.add_memory("Adores felines and owns two of them", target_vec)
+        results = memory_ctx.retrieve_relevant(query, top_k=4)
+        logger.info(f"Results: {results}")
+        assert "Adores felines and owns two of them" in results and memory_ctx.stats["prefiltered"] == 0
+        for f in Path(".").glob("memory_db.test_paraphrase*.json"): f.unlink()
+        logger.info("✓ Paraphrase retrieval test PASSED\n")
+        return True
+    except Exception as e:
+        logger.error(f"✗ Paraphrase retrieval test FAILED: {e}")
+        return False
+
+def test_inverted_index():
+    logger.info("="*30 + " Inverted Index " + "="*30)
+    try:
+        index = InvertedIndex()
+        index.add(0, "The user has a dog named Rex")
+        index.add(1, "The user likes Python programming")
+        index.add(2, "The user walks the dog every morning")
+        hits = index.search("Where does Rex sleep?", top_k=2)
+        assert hits[0][0] == 0 and len(hits) == 1
+        assert sorted(h[0] for h in index.search("dog", top_k=3)) == [0, 2]
+        index.remove(0)
+        assert index.search("Rex") == [] and index.doc_freq("dog") == 1
+        logger.info("✓ Inverted index test PASSED\n")
+        return True
+    except Exception as e:
+        logger.error(f"✗ Inverted index test FAILED: {e}")
+        return False
+
 def test_chroma_store():
     logger.info("="*30 + " Chroma Store " + "="*30)
     try:
@@ -94,12 +199,221 @@ def test_profile_manager():
         logger.error(f"✗ Profile manager test FAILED: {e}")
         return False
 
+class _SlowClient:
+    async def chat(self, model, messages, stream=False, **kwargs):
+        async def inner():
+            for i in range(1000):
+                await asyncio.sleep(0.01)
+                yield {"message": {"content": f"t{i} "}, "done": False}
+        return inner()
+
+def test_generation_cancel():
+    logger.info("="*30 + " Generation Cancel " + "="*30)
+    async def scenario():
+        net = DynamicNeuralNetwork()
+        net.client = _SlowClient()
+        stream = await net.forward("dream", "sys", use_fast=True, stream=True, background=True)
+        thought = asyncio.create_task(net.forward("think", "sys", use_fast=True))
+        received = 0
+        async for _ in stream:
+            received += 1
+            if received == 5: assert net.cancel_generations() == 2
+        assert stream.preempted and await thought is None
+        await asyncio.sleep(0)
+        return net.get_generation_stats()
+    try:
+        stats = asyncio.run(scenario())
+        logger.info(f"Generation stats: {stats}")
+        assert stats["cancelled"] == 2 and stats["inflight"] == 0
+        assert stats["wasted_tokens"] > 5 and stats["delivered_tokens"] == 0
+        logger.info("✓ Generation cancel test PASSED\n")
+        return True
+    except Exception as e:
+        logger.error(f"✗ Generation cancel test FAILED: {e}")
+        return False
+
+class _EchoClient:
+    async def chat(self, model, messages, stream=False, **kwargs):
+        async def inner():
+            yield {"message": {"content": f"summary: {messages[-1]['content']}"}, "done": False}
+            yield {"message": {"content": ""}, "done": True, "eval_count": 3}
+        return inner()
+
+def test_batch_consolidate():
+    logger.info("="*30 + " Batch Consolidate " + "="*30)
+    import shutil
+    import importlib.util
+    from core.snapshot import load_state
+    root = Path("batch_test")
+    try:
+        spec = importlib.util.spec_from_file_location("batch_consolidate", Path(__file__).resolve().parent.parent / "scripts" / "batch_consolidate.py")
+        batch = importlib.util.module_from_spec(spec)
+        spec.loader.exec_module(batch)
+        class EchoNetwork(DynamicNeuralNetwork):
+            def __init__(self):
+                super().__init__()
+                self.client = _EchoClient()
+        batch.DynamicNeuralNetwork = EchoNetwork
+        
+        (root / "agents").mkdir(parents=True, exist_ok=True)
+        for agent in ("a1", "a2"):
+            with open(root / "agents" / f"{agent}.wal", "w", encoding="utf-8") as f:
+                for seq, (text, tenant) in enumerate([(f"User: {agent} likes tea", "default"), (f"User: {agent} owns a cat", "bob")], 1):
+                    f.write(json.dumps({"seq": seq, "op": "enqueue", "args": [text, tenant]}) + "\n")
+        argv = [str(root / "agents"), "--numpy", "--workers", "0"]
+        assert batch.main(argv) == 2
+        argv += ["--store-root", str(root / "stores")]
+        
+        (root / "stores" / "a2").mkdir(parents=True)
+        store_lock = acquire_lock(str(root / "stores" / "a2" / "memory_db.json.lock"))
+        assert batch.main(argv) == 1
+        release_lock(store_lock)
+        assert load_state(str(root / "agents" / "a2.snap"), str(root / "agents" / "a2.wal"))["memory"]["queues"]["bob"]
+        assert batch.main(argv) == 0
+        
+        for agent in ("a1", "a2"):
+            state = load_state(str(root / "agents" / f"{agent}.snap"), str(root / "agents" / f"{agent}.wal"))
+            assert state["seq"] == 4 and state["memory"]["queues"] == {}
+            acks = [json.loads(line) for line in open(root / "agents" / f"{agent}.wal", encoding="utf-8")][2:]
+            assert [(r["seq"], r["args"][1]) for r in acks] == [(3, "default"), (4, "bob")]
+            shards = {name: json.load(open(root / "stores" / agent / name, encoding="utf-8"))["texts"]
+                      for name in ("memory_db.json", "memory_db.bob.json")}
+            assert f"{agent} likes tea" in shards["memory_db.json"][0] and f"{agent} owns a cat" in shards["memory_db.bob.json"][0]
+            assert all(len(texts) == 1 for texts in shards.values())
+        logger.info("✓ Batch consolidate test PASSED\n")
+        return True
+    except Exception as e:
+        logger.error(f"✗ Batch consolidate test FAILED: {e}")
+        return False
+    finally: shutil.rmtree(root, ignore_errors=True)
+
+def test_model_router():
+    logger.info("="*30 + " Model Router " + "="*30)
+    try:
+        router = ModelRouter()
+        simple = router.route("hi there")
+        hard = router.route("Can you explain why my async code raises this error and how to debug it step by step?")
+        assert simple.model == router.fixed(True).model and hard.model == router.fixed(False).model
+        assert router.route("What is my name?").model == router.fixed(False).model
+        net = DynamicNeuralNetwork()
+        net.complexity_level = 10
+        assert net.route("hi there").reason == "trivial"
+        assert simple.temperature == hard.temperature
+        hard_q = "Explain how to design a distributed cache and compare it with a CDN?"
+        assert router.route(hard_q, queue_depth=router.max_queue).reason == "overload:queue"
+        router.observe(router.fixed(False).model, router.slo * 2)
+        assert router.route(hard_q).reason == "overload:latency"
+        stats = router.get_stats()
+        logger.info(f"Router stats: {stats}")
+        assert stats["degraded"] == 2 and stats["full"] == 2
+        logger.info("✓ Model router test PASSED\n")
+        return True
+    except Exception as e:
+        logger.error(f"✗ Model router test FAILED: {e}")
+        return False
+
+def test_sentiment():
+    logger.info("="*30 + " Sentiment " + "="*30)
+    try:
+        from core.memory_system import embedding_model
+        scorer = SentimentScorer(embedding_model)
+        msgs = ["This is wonderful, thank you!", "You are useless and I'm angry.", "What is the capital of France?"]
+        scores = scorer.score_batch(embedding_model.encode(msgs))
+        logger.info(f"Scores: {dict(zip(msgs, scores.round(3)))}")
+        assert scores[0] > 0.3 and scores[1] < -0.3 and scores[1] < scores[2] < scores[0]
+        assert abs(scorer.score(embedding_model.encode(msgs[0])) - scores[0]) < 1e-5
+        logger.info("✓ Sentiment test PASSED\n")
+        return True
+    except Exception as e:
+        logger.error(f"✗ Sentiment test FAILED: {e}")
+        return False
+
+def test_snapshot_restore():
+    logger.info("="*30 + " Snapshot Restore " + "="*30)
+    def build():
+        return (HormoneModulator(), ContextManager(use_chroma=False, tenant="test_snapshot"), DynamicNeuralNetwork(),
+                ProfileManager(filepath="profile_test.json"), {"last_evolve_time": 0})
+    try:
+        for f in ("snapshot_test.snap", "snapshot_test.wal"):
+            if Path(f).exists(): Path(f).unlink()
+        hormones, memory, net, profile, state = build()
+        snap = SnapshotManager(hormones, memory, net, profile, state, "snapshot_test.snap", "snapshot_test.wal")
+        snap.lock()
+        assert acquire_lock("snapshot_test.wal.lock") is None
+        snap.restore()
+        snap.attach()
+        for i in range(memory.max_buffer + 3): memory.add_to_buffer("User", f"message {i}")
+        hormones.update_hormones(0.3, -0.1, 0.0)
+        net.complexity_level = 4
+        assert asyncio.run(snap.save())
+        memory.add_to_buffer("Agent", "written after the snapshot")
+        memory.enqueue("Dream (a futuristic city): unconsolidated")
+        snap.close()
+        
+        hormones2, memory2, net2, profile2, state2 = build()
+        restored = SnapshotManager(hormones2, memory2, net2, profile2, state2, "snapshot_test.snap", "snapshot_test.wal")
+        elapsed = restored.restore()
+        logger.info(f"Restore took {elapsed:.2f} ms: {restored.get_stats()}")
+        assert memory2.buffer == memory.buffer and memory2.queue == memory.queue
+        assert hormones2.get_state() == hormones.get_state() and net2.complexity_level == 4
+        assert restored.stats["replayed"] == 2
+        fd = acquire_lock("snapshot_test.wal.lock")
+        assert fd is not None
+        release_lock(fd)
+        logger.info("✓ Snapshot restore test PASSED\n")
+        return True
+    except Exception as e:
+        logger.error(f"✗ Snapshot restore test FAILED: {e}")
+        return False
+    finally:
+        for f in ("snapshot_test.snap", "snapshot_test.wal", "snapshot_test.wal.lock"):
+            if Path(f).exists(): Path(f).unlink()
+
+def test_context_builder():
+    logger.info("="*30 + " Context Builder " + "="*30)
+    try:
+        builder = ContextBuilder(TokenCounter())
+        history = [f"User: message {i} about my tomato garden" for i in range(10)]
+        memories = ["The user grows tomatoes. " * 60, "The user lives in Seoul", "The user has a dog named Rex. " * 60]
+        prompt, message = builder.build("You are a helpful AI assistant.", "What should I plant next?", history, memories, num_ctx=700)
+        stats = builder.get_stats()
+        logger.info(f"Context stats: {stats}")
+        assert stats["last"]["prompt_tokens"] <= 700 - 512 and stats["prompt_tokens"] < stats["unbounded_tokens"]
+        assert stats["prompt_tokens"] < stats["legacy_tokens"] < stats["unbounded_tokens"]
+        assert "The user lives in Seoul" in prompt and "message 9" in prompt and "message 0 " not in prompt
+        assert message == "What should I plant next?" and stats["prompt_trimmed"] == 0
+        
+        pasted = "Why does this fail?\n```\n" + "def handler(event, context): return process(event['body'])\n" * 80 + "```"
+        identity = "Your name is Nova. Known user facts: grows tomatoes, lives in Seoul."
+        prompt, message = builder.build("You are a helpful AI assistant.", pasted, history, memories, num_ctx=700, identity=identity)
+        last = builder.get_stats()["last"]
+        assert last["prompt_tokens"] <= 700 - 512 and builder.stats["prompt_trimmed"] == 1
+        assert prompt.startswith("You are a helpful AI assistant.\n" + identity) and message.startswith("Why does this fail?")
+        assert message.endswith("…") and builder.counter.count(message) < builder.counter.count(pasted)
+        builder.build("You are a helpful AI assistant.", "What should I plant next?", history, memories, num_ctx=700)
+        assert builder.counter.stats["hits"] > 0
+        logger.info("✓ Context builder test PASSED\n")
+        return True
+    except Exception as e:
+        logger.error(f"✗ Context builder test FAILED: {e}")
+        return False
+
 def main():
     results = {
         "Hormone System": test_hormone_system(),
         "Memory System": test_memory_system(),
+        "Memory Partitions": test_memory_partitions(),
+        "Tenant Isolation": test_tenant_isolation(),
+        "Paraphrase Retrieval": test_paraphrase_retrieval(),
+        "Inverted Index": test_inverted_index(),
         "Chroma Store": test_chroma_store(),
-        "Profile Manager": test_profile_manager()
+        "Profile Manager": test_profile_manager(),
+        "Generation Cancel": test_generation_cancel(),
+        "Model Router": test_model_router(),
+        "Sentiment": test_sentiment(),
+        "Snapshot Restore": test_snapshot_restore(),
+        "Batch Consolidate": test_batch_consolidate(),
+        "Context Builder": test_context_builder()
     }
     passed = sum(1 for v in results.values() if v)
     for name, res in results.items():